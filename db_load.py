@@ -1,17 +1,25 @@
 import os
+import re
+import threading
+from array import array
 from collections import defaultdict
 from datetime import datetime
+from typing import Iterator
 from typing import Optional
+from typing import Sequence
+from typing import TYPE_CHECKING
 
-import psycopg2
-import sqlalchemy
-from sqlalchemy import text
-from sqlalchemy.orm import Session
-from sqlalchemy.orm import sessionmaker
-
+from player_names import apply_portal_names
+from player_names import build_player_names
+from player_names import load_player_names_csv
 from structs import Game
 from structs import Player
 
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Session
+
+# psycopg2 and sqlalchemy are imported inside functions: runs with games loaded from files don't need them
+
 
 class DbConnectionProvider:
     def __init__(self, pantheon_type: str):
@@ -19,6 +27,7 @@ class DbConnectionProvider:
         self.pantheon_type = pantheon_type
 
     def get_creator(self, db_type: str):
+        import psycopg2
         if db_type == "mimir":
             user = os.getenv("MIMIR_USER") or "mimir"
             password = os.getenv("MIMIR_PASSWORD") or "mimir"
@@ -38,14 +47,111 @@ class DbConnectionProvider:
         print(f"Will connect to: {host}:{port}, db name {db_name}, user {user}, password {password[0]}...{password[-1]}")
         return psycopg2.connect(user=user, password=password, host=host, port=port, dbname=db_name)
 
-    def get_session(self, db_type: str) -> Session:
+    def get_session(self, db_type: str) -> 'Session':
+        import sqlalchemy
+        from sqlalchemy.orm import Session
+        from sqlalchemy.orm import sessionmaker
         engine = sqlalchemy.create_engine(url="postgresql+psycopg2://", creator=lambda: self.get_creator(db_type=db_type))
         session_maker = sessionmaker(bind=engine)
         db_session: Session = session_maker()
         return db_session
 
+    def fetch_columns(self, db_type: str, query: str, column_types: list[str], bulk: bool) -> list[Sequence]:
+        # bulk mode streams the whole query result with 'copy ... to stdout' instead of fetching rows one by one;
+        # both modes convert values column by column, a chunk of rows at a time
+        columns = [array("q") if column_type == "int" else array("d") if column_type == "float" else []
+                   for column_type in column_types]
+        if bulk:
+            connection = self.get_creator(db_type=db_type)
+            try:
+                connection.set_client_encoding("UTF8")
+                for chunk_columns in stream_copy_chunks(connection=connection, query=query, column_count=len(column_types)):
+                    extend_columns(columns=columns, column_types=column_types, chunk_columns=chunk_columns, from_text=True)
+            finally:
+                connection.close()
+        else:
+            from sqlalchemy import text
+            with self.get_session(db_type=db_type) as db_session:
+                for rows in db_session.execute(text(query)).partitions(FETCH_CHUNK_ROWS):
+                    extend_columns(columns=columns, column_types=column_types, chunk_columns=list(zip(*rows)), from_text=False)
+        return columns
+
+
+FETCH_CHUNK_ROWS = 100000
+COPY_CHUNK_BYTES = 4 * 1024 * 1024
+
+# https://www.postgresql.org/docs/current/sql-copy.html - the only backslash sequences copy emits in text format
+COPY_TEXT_NULL = "\\N"
+COPY_TEXT_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\"}
+COPY_TEXT_ESCAPE_RE = re.compile(r"\\(.)")
+
+
+def stream_copy_chunks(connection, query: str, column_count: int) -> Iterator[list[list[str]]]:
+    # copy runs in a thread writing into a pipe, output is split into lines and columns chunk by chunk as it arrives,
+    # so the whole output is never held in memory. Text format is used instead of csv, because csv can't tell null from an empty string
+    read_fd, write_fd = os.pipe()
+    errors: list[BaseException] = []
+
+    def write():
+        try:
+            with os.fdopen(write_fd, "wb") as writer, connection.cursor() as cursor:
+                cursor.copy_expert(f"copy ({query}) to stdout", writer)
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    try:
+        with os.fdopen(read_fd, "rb") as reader:  # closing it on error stops the writer with a broken pipe
+            rest = b""
+            while True:
+                data = reader.read(COPY_CHUNK_BYTES)
+                if len(data) == 0:
+                    break
+                data = rest + data
+                end = data.rfind(b"\n") + 1  # newlines inside values are escaped, and never occur inside utf-8 characters
+                rest = data[end:]
+                if end > 0:
+                    # one flat list of values instead of a list per row: strings are not tracked by gc, lists would trigger it all the time
+                    values = data[:end - 1].decode("utf-8").replace("\n", "\t").split("\t")
+                    assert len(values) % column_count == 0
+                    yield [values[i::column_count] for i in range(column_count)]
+            assert len(rest) == 0
+    finally:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def parse_copy_text_value(value: str) -> Optional[str]:
+    if value == COPY_TEXT_NULL:
+        return None
+    if "\\" not in value:
+        return value
+    return COPY_TEXT_ESCAPE_RE.sub(lambda m: COPY_TEXT_ESCAPES[m.group(1)], value)
+
+
+def extend_columns(columns: list[Sequence], column_types: list[str], chunk_columns: list[Sequence], from_text: bool):
+    assert len(chunk_columns) == len(columns)
+    null = COPY_TEXT_NULL if from_text else None
+    for column, column_type, values in zip(columns, column_types, chunk_columns):
+        if column_type in ("int", "float"):
+            if null in values:
+                raise Exception(f"Unexpected null in {column_type} column")
+            column.extend(map(int if column_type == "int" else float, values))
+        elif column_type == "str":
+            if from_text and "\\" in "".join(values):  # nulls and escaped characters are rare, other values are taken as they are
+                column.extend(map(parse_copy_text_value, values))
+            else:
+                column.extend(values)
+        elif column_type == "datetime":
+            column.extend([None if value == null else datetime.fromisoformat(value) for value in values] if from_text else values)
+        else:
+            raise Exception(f"Wrong column_type {column_type}")
+
 
 def log_tournaments_info(pantheon_type: str, online: bool):
+    from sqlalchemy import text
     db_connection_provider = DbConnectionProvider(pantheon_type=pantheon_type)
 
     with db_connection_provider.get_session(db_type="mimir") as db_session:
@@ -77,20 +183,20 @@ def load_games(pantheon_type: str,
                portal_names_map: dict[tuple[str, int], str],
                player_names_file: Optional[str],
                force_event_ids_to_load: Optional[list[int]],
+               bulk: bool = False,
                ) -> list[Game]:
     db_connection_provider = DbConnectionProvider(pantheon_type=pantheon_type)
 
-    good_event_ids: set[int] = set()
-    with db_connection_provider.get_session(db_type="mimir") as db_session:
-        # https://github.com/MahjongPantheon/pantheon/blob/7a3c326d7fc8339e4a874371c5c2ae543712b36d/Mimir/src/models/Event.php#L478-L480
-        if online:
-            where_condition = "(is_online != 0)"
-        else:
-            where_condition = "(is_online = 0) and (sync_start != 0)"
-        result = db_session.execute(text(f"select id from event where {where_condition}"))
-        for row in result.all():
-            event_id = int(row[0])
-            good_event_ids.add(event_id)
+    # https://github.com/MahjongPantheon/pantheon/blob/7a3c326d7fc8339e4a874371c5c2ae543712b36d/Mimir/src/models/Event.php#L478-L480
+    if online:
+        where_condition = "(is_online != 0)"
+    else:
+        where_condition = "(is_online = 0) and (sync_start != 0)"
+    [event_ids] = db_connection_provider.fetch_columns(db_type="mimir",
+                                                       query=f"select id from event where {where_condition}",
+                                                       column_types=["int"],
+                                                       bulk=bulk)
+    good_event_ids: set[int] = set(event_ids)
 
     if force_event_ids_to_load is not None:
         good_event_ids.update(force_event_ids_to_load)
@@ -98,37 +204,34 @@ def load_games(pantheon_type: str,
     session_date_map: dict[int, datetime] = {}
     session_event_map: dict[int, int] = {}
     total_game_count: dict[int, int] = defaultdict(int)
-    with db_connection_provider.get_session(db_type="mimir") as db_session:
-        result = db_session.execute(text("select id, event_id, end_date from session where status = 'finished'"))
-        for row in result.all():
-            session_id = int(row[0])
-            event_id = int(row[1])
-            session_date = row[2]
-            if event_id not in good_event_ids:
-                continue
-            assert session_id not in session_date_map
-            session_date_map[session_id] = session_date
-            session_event_map[session_id] = event_id
-            total_game_count[event_id] += 1
+    session_columns = db_connection_provider.fetch_columns(db_type="mimir",
+                                                           query="select id, event_id, end_date from session where status = 'finished'",
+                                                           column_types=["int", "int", "datetime"],
+                                                           bulk=bulk)
+    for session_id, event_id, session_date in zip(*session_columns):
+        if event_id not in good_event_ids:
+            continue
+        assert session_id not in session_date_map
+        session_date_map[session_id] = session_date
+        session_event_map[session_id] = event_id
+        total_game_count[event_id] += 1
     print(f"{len(session_date_map)} sessions loaded")
 
     session_results: dict[int, dict[int, tuple[int, float]]] = defaultdict(dict)
-    with db_connection_provider.get_session(db_type="mimir") as db_session:
-        result = db_session.execute(text("select session_id, player_id, place, rating_delta from session_results"))
-        for row in result.all():
-            session_id = int(row[0])
-            player_id = int(row[1])
-            place = int(row[2])
-            score = float(row[3])
-            if session_id not in session_date_map:
-                continue
-            event_game_count = total_game_count[session_event_map[session_id]]
-            assert event_game_count > 0
-            assert 1 <= place <= 4
-            assert isinstance(score, (int, float))
-            assert -1000000 <= score <= 1000000
-            assert player_id not in session_results[session_id].values()
-            session_results[session_id][player_id] = (place, score)
+    session_results_columns = db_connection_provider.fetch_columns(db_type="mimir",
+                                                                   query="select session_id, player_id, place, rating_delta from session_results",
+                                                                   column_types=["int", "int", "int", "float"],
+                                                                   bulk=bulk)
+    for session_id, player_id, place, score in zip(*session_results_columns):
+        if session_id not in session_date_map:
+            continue
+        event_game_count = total_game_count[session_event_map[session_id]]
+        assert event_game_count > 0
+        assert 1 <= place <= 4
+        assert isinstance(score, (int, float))
+        assert -1000000 <= score <= 1000000
+        assert player_id not in session_results[session_id].values()
+        session_results[session_id][player_id] = (place, score)
     print(f"{len(session_results)} sessions with results loaded")
 
     broken_session_ids = []
@@ -142,70 +245,32 @@ def load_games(pantheon_type: str,
         session_date_map.pop(session_id)
         session_results.pop(session_id)
 
-    players_by_id: dict[int, Player] = {}
     if pantheon_type == "new":
         if player_names_file is not None and os.path.exists(player_names_file):
             print(f"Loading players from csv file {player_names_file}")
-            with open(player_names_file) as fd:
-                line: str
-                for index, line in enumerate(fd):
-                    if index == 0:
-                        continue
-                    line = line.strip()
-                    if not line:
-                        continue
-                    i = 0
-                    while line[i].isdigit():
-                        i += 1
-                    player_id = int(line[:i])
-                    player_name = line[i + 1:]
-                    if len(player_name) >= 2 and player_name.startswith("\"") and player_name.endswith("\""):
-                        player_name = player_name[1:-1]
-                    player_name = player_name.strip()
-                    while "\"\"" in player_name:
-                        player_name = player_name.replace("\"\"", "\"")
-                    assert player_id not in players_by_id
-                    if (pantheon_type, player_id) in portal_names_map:
-                        portal_name = portal_names_map[(pantheon_type, player_id)]
-                        if portal_name != player_name:
-                            print(f"Force use portal name {portal_name} instead of {player_name} "
-                                  f"for type {pantheon_type}, id {player_id}")
-                            player_name = portal_name
-                    players_by_id[player_id] = Player.create_new(name=player_name, player_id=player_id)
-            print(f"{len(players_by_id)} players loaded from csv file")
+            names_by_id = load_player_names_csv(filename=player_names_file)
+            print(f"{len(names_by_id)} players loaded from csv file")
         else:
             print("Loading players from Frey DB")
-            with db_connection_provider.get_session(db_type="frey") as db_session:
-                result = db_session.execute(text("select id, title from person"))
-                for row in result.all():
-                    player_id = int(row[0])
-                    player_name = row[1].strip()
-                    assert player_id not in players_by_id
-                    if (pantheon_type, player_id) in portal_names_map:
-                        portal_name = portal_names_map[(pantheon_type, player_id)]
-                        if portal_name != player_name:
-                            print(f"Force use portal name {portal_name} instead of {player_name} "
-                                  f"for type {pantheon_type}, id {player_id}")
-                            player_name = portal_name
-                    players_by_id[player_id] = Player.create_new(name=player_name, player_id=player_id)
-            print(f"{len(players_by_id)} players loaded from new DB")
+            person_ids, person_names = db_connection_provider.fetch_columns(db_type="frey",
+                                                                            query="select id, title from person",
+                                                                            column_types=["int", "str"],
+                                                                            bulk=bulk)
+            names_by_id = build_player_names(player_ids=person_ids, player_names=person_names)
+            print(f"{len(names_by_id)} players loaded from new DB")
     elif pantheon_type == "old":
-        with db_connection_provider.get_session(db_type="mimir") as db_session:
-            result = db_session.execute(text("select id, display_name from player"))
-            for row in result.all():
-                player_id = int(row[0])
-                player_name = row[1].strip()
-                assert player_id not in players_by_id
-                if (pantheon_type, player_id) in portal_names_map:
-                    portal_name = portal_names_map[(pantheon_type, player_id)]
-                    if portal_name != player_name:
-                        print(f"Force use portal name {portal_name} instead of {player_name} "
-                              f"for type {pantheon_type}, id {player_id}")
-                        player_name = portal_name
-                players_by_id[player_id] = Player.create_old(name=player_name, player_id=player_id)
-        print(f"{len(players_by_id)} players loaded from old DB")
+        player_ids, player_names = db_connection_provider.fetch_columns(db_type="mimir",
+                                                                        query="select id, display_name from player",
+                                                                        column_types=["int", "str"],
+                                                                        bulk=bulk)
+        names_by_id = build_player_names(player_ids=player_ids, player_names=player_names)
+        print(f"{len(names_by_id)} players loaded from old DB")
     else:
         raise Exception(f"Wrong pantheon_type: {pantheon_type}")
+    apply_portal_names(names_by_id=names_by_id, pantheon_type=pantheon_type, portal_names_map=portal_names_map)
+    create_player = Player.create_new if pantheon_type == "new" else Player.create_old
+    players_by_id: dict[int, Player] = {player_id: create_player(name=player_name, player_id=player_id)
+                                        for player_id, player_name in names_by_id.items()}
 
     sessions_by_date: list[int] = list(session_results.keys())
     sessions_by_date.sort(key=lambda s: session_date_map[s])
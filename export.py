@@ -0,0 +1,124 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from typing import Optional
+
+import ujson
+
+from structs import RatingResult
+
+# rendering of computed leaderboards: json export for portal, text log and compact csv
+OUTPUT_FORMATS = ["json", "log", "csv"]
+
+
+class ExportJob:
+    def __init__(self, rating_model_name: str, online: bool, rows: list[dict[str, Any]],
+                 games_by_event: dict[tuple[str, int], int], output_files: dict[str, str]):
+        assert set(output_files.keys()).issubset(OUTPUT_FORMATS)
+        self.rating_model_name = rating_model_name
+        self.online = online
+        self.rows = rows  # plain data only, jobs are sent to worker processes
+        self.games_by_event = games_by_event
+        self.output_files = output_files
+
+
+def build_export_rows(rating_result: RatingResult) -> list[dict[str, Any]]:
+    rows = []
+    for player, player_stats in rating_result.leaderboard:
+        # if date_to - player_stats.last_game_date.date() > timedelta(days=365 * 2):
+        #     continue
+        mean, stddev = player_stats.mean_and_stddev
+        rows.append({
+            "name": player.name,
+            "old_ids": player.old_ids,
+            "new_ids": player.new_ids,
+            "rating": player_stats.rating_for_sorting,
+            "mean": mean,
+            "stddev": stddev,
+            "game_count": player_stats.total_games,
+            "places": player_stats.places,
+            "last_game_date": player_stats.last_game_date.strftime("%Y-%m-%d"),
+            "event_game_counts": [(t, i, player_stats.event_game_counts[(t, i)]) for (t, i) in player_stats.sorted_events],
+        })
+    return rows
+
+
+def render_json(job: ExportJob) -> str:
+    export_results = []
+    for row in job.rows:
+        export_element = {
+            "player": row["name"],
+            "rating": round(row["rating"], 3),
+            "mean": round(row["mean"], 3),
+            "stddev": round(row["stddev"], 3),
+            "game_count": row["game_count"],
+            "places": str(row["places"]),
+            "last_game_date": row["last_game_date"],
+            "event_game_counts": [t + "_" + str(i) + " -> " + str(c) for (t, i, c) in row["event_game_counts"]],
+        }
+        if len(row["old_ids"]) > 0:
+            export_element["old_ids"] = str(row["old_ids"])
+        if len(row["new_ids"]) > 0:
+            export_element["new_ids"] = str(row["new_ids"])
+        export_results.append(export_element)
+
+    ts_rating = {
+        "tournament_ids": [{"pantheon_type": et, "pantheon_id": eid, "game_count": cnt} for (et, eid), cnt in sorted(job.games_by_event.items())],
+        job.rating_model_name: export_results,
+    }
+    return ujson.dumps(ts_rating, ensure_ascii=False, indent=2)
+
+
+def render_log(job: ExportJob) -> str:
+    return "".join(
+        f"Player {row['name']} (old ids {row['old_ids']}, new ids {row['new_ids']}): confirmed rating {row['rating']:.3f} "
+        f"({row['mean']:.3f} +/- {row['stddev']:.3f}) in {row['game_count']} games ({row['places']})\n"
+        for row in job.rows
+    )
+
+
+def render_csv(job: ExportJob) -> str:
+    lines = ["rank,player,rating,mean,stddev,game_count,place_1,place_2,place_3,place_4,last_game_date\n"]
+    for rank, row in enumerate(job.rows, start=1):
+        name = "\"" + row["name"].replace("\"", "\"\"") + "\""
+        places = ",".join(str(p) for p in row["places"])
+        lines.append(f"{rank},{name},{row['rating']:.3f},{row['mean']:.3f},{row['stddev']:.3f},{row['game_count']},{places},{row['last_game_date']}\n")
+    return "".join(lines)
+
+
+def render(job: ExportJob, output_format: str) -> str:
+    match output_format:
+        case "json":
+            return render_json(job=job)
+        case "log":
+            return render_log(job=job)
+        case "csv":
+            return render_csv(job=job)
+        case _:
+            raise Exception(f"Wrong output format {output_format}")
+
+
+def export_job(job: ExportJob, print_player_log: bool) -> Optional[str]:
+    # all formats of a job are rendered by one task, so its rows are sent to a worker once; returns player log to print
+    texts: dict[str, str] = {}
+    for output_format, filename in job.output_files.items():
+        texts[output_format] = render(job=job, output_format=output_format)
+        with open(filename, "w") as f:
+            f.write(texts[output_format])
+    if not print_player_log:
+        return None
+    return texts["log"] if "log" in texts else render(job=job, output_format="log")
+
+
+def write_exports(jobs: list[ExportJob], workers: int, print_player_log: bool):
+    # rendering is cheap compared to sending rows to another process, so the pool helps only with several large jobs
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as executor:
+            player_logs = list(executor.map(export_job, jobs, [print_player_log] * len(jobs)))
+    else:
+        player_logs = [export_job(job=job, print_player_log=print_player_log) for job in jobs]
+
+    for job, player_log in zip(jobs, player_logs):
+        if player_log is not None:
+            print(player_log, end="")
+        for output_format, filename in job.output_files.items():
+            print(f"Rating by model '{job.rating_model_name}' (online: {job.online}) exported as {output_format} to file {filename}")
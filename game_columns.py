@@ -0,0 +1,97 @@
+import bisect
+from array import array
+from collections import Counter
+from collections import defaultdict
+from datetime import date
+from datetime import datetime
+from datetime import time
+from datetime import timedelta
+from typing import Sequence
+
+from structs import Game
+from structs import Player
+
+# games encoded once per game set as flat typed columns, rating replay works on player indices instead of Player objects
+
+EPOCH = datetime(1970, 1, 1)
+
+# column name -> (array typecode, values per game)
+COLUMNS: dict[str, tuple[str, int]] = {
+    "session_date": ("q", 1),  # microseconds since epoch, games are sorted by it
+    "event": ("i", 1),  # index in events
+    "seat_count": ("b", 1),  # number of rated players
+    "seat_players": ("i", 4),  # index in players, rated players first, sorted as for process_game, -1 for the rest
+    "seat_scores": ("d", 4),
+    "seat_places": ("b", 4),
+}
+
+
+def is_replacement_player_for_game(player: Player, game: Game) -> bool:
+    if player.is_replacement_player:
+        return True
+    key = (game.pantheon_type, game.event_id, game.session_id)
+    return key in player.temporary_replacements
+
+
+def to_microseconds(value: datetime) -> int:
+    assert value.tzinfo is None
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+class GameColumns:
+    def __init__(self, players: list[Player], events: list[tuple[str, int]], columns: dict[str, Sequence]):
+        self.players = players  # rated players in order of their first game
+        self.events = events  # (pantheon_type, event_id) in order of their first game
+        self.columns = columns
+        self.game_count = len(columns["session_date"])
+        for name, (_, values_per_game) in COLUMNS.items():
+            assert len(columns[name]) == self.game_count * values_per_game
+
+    @staticmethod
+    def from_games(games: list[Game]) -> 'GameColumns':
+        # replacement players are dropped here, so replay doesn't check them for every game
+        player_indices: dict[Player, int] = {}
+        players: list[Player] = []
+        event_indices: dict[tuple[str, int], int] = {}
+        events: list[tuple[str, int]] = []
+        columns = {name: array(typecode) for name, (typecode, _) in COLUMNS.items()}
+        for game in sorted(games, key=lambda g: g.session_date):  # there were games in old pantheon played later than some games in new pantheon
+            seats = [i for i in range(4) if not is_replacement_player_for_game(player=game.players[i], game=game)]
+            for i in seats:
+                if game.players[i] not in player_indices:
+                    player_indices[game.players[i]] = len(players)
+                    players.append(game.players[i])
+            seats.sort(key=lambda i: (-game.scores[i], game.players[i].name))
+            event = (game.pantheon_type, game.event_id)
+            if event not in event_indices:
+                event_indices[event] = len(events)
+                events.append(event)
+
+            columns["session_date"].append(to_microseconds(game.session_date))
+            columns["event"].append(event_indices[event])
+            columns["seat_count"].append(len(seats))
+            for i in seats:
+                columns["seat_players"].append(player_indices[game.players[i]])
+                columns["seat_scores"].append(game.scores[i])
+                columns["seat_places"].append(game.places[i])
+            for _ in range(4 - len(seats)):
+                columns["seat_players"].append(-1)
+                columns["seat_scores"].append(0.0)
+                columns["seat_places"].append(0)
+        print(f"{len(games)} games with {len(players)} rated players encoded")
+        return GameColumns(players=players, events=events, columns=columns)
+
+    def get_session_date(self, game_index: int) -> datetime:
+        return EPOCH + timedelta(microseconds=self.columns["session_date"][game_index])
+
+    def count_games_till(self, date_to: date) -> int:
+        # games are sorted by date, so games till date_to are a prefix
+        next_day_start = to_microseconds(datetime.combine(date_to + timedelta(days=1), time()))
+        return bisect.bisect_left(self.columns["session_date"], next_day_start)
+
+    def count_players(self, game_count: int) -> int:
+        # players are numbered in order of their first game, so players of first games are a prefix too
+        return max(self.columns["seat_players"][:4 * game_count], default=-1) + 1
+
+    def get_games_by_event(self) -> dict[tuple[str, int], int]:
+        return defaultdict(int, ((self.events[event_index], count) for event_index, count in Counter(self.columns["event"]).items()))
@@ -0,0 +1,78 @@
+import mmap
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from typing import Any
+
+import ujson
+
+from game_columns import COLUMNS
+from game_columns import GameColumns
+from structs import Player
+
+# encoded game columns of one game set saved as flat binary files, so later runs over the same data skip portal,
+# DB or file loading, parsing and encoding. Attached columns are read-only mmaps used by rating replay directly:
+# processes attached to one snapshot share one page-cache copy of game data instead of building their own games
+
+
+def publish_game_snapshot(game_columns: GameColumns, source: dict[str, Any], directory: str):
+    # source describes where games came from (online mode, games files or DB, portal event ids filter)
+    # every publish writes a new version directory, then the symlink at 'directory' is atomically switched to it
+    directory = os.path.abspath(directory)
+    if os.path.exists(directory) and not os.path.islink(directory):
+        raise Exception(f"{directory} exists and is not a snapshot symlink, remove it first")
+    version_prefix = os.path.basename(directory) + ".v"
+    version_directory = tempfile.mkdtemp(dir=os.path.dirname(directory), prefix=f"{version_prefix}{time.time_ns()}.")
+    os.chmod(version_directory, 0o755)
+    for name in COLUMNS:
+        with open(os.path.join(version_directory, f"{name}.bin"), "wb") as f:
+            f.write(game_columns.columns[name])
+    with open(os.path.join(version_directory, "players.txt"), "w") as f:  # replacement players are already dropped from columns
+        for player in game_columns.players:
+            f.write(ujson.dumps(player.to_json(), ensure_ascii=False))
+            f.write("\n")
+    with open(os.path.join(version_directory, "meta.json"), "w") as f:
+        ujson.dump({"game_count": game_columns.game_count, "player_count": len(game_columns.players),
+                    "events": game_columns.events, "source": source}, f)
+
+    tmp_link = f"{directory}.link.{os.getpid()}"
+    os.symlink(os.path.basename(version_directory), tmp_link)
+    os.replace(tmp_link, directory)
+
+    # the previous version is kept for readers which resolved the symlink just before the switch,
+    # older ones are removed (already attached readers keep their mapped files)
+    versions = sorted((name for name in os.listdir(os.path.dirname(directory)) if name.startswith(version_prefix)),
+                      key=lambda name: int(name[len(version_prefix):].split(".")[0]))
+    for name in versions[:-2]:
+        shutil.rmtree(os.path.join(os.path.dirname(directory), name))
+    print(f"Snapshot of {game_columns.game_count} games and {len(game_columns.players)} players published to directory {version_directory}, linked from {directory}")
+
+
+def attach_game_snapshot(directory: str, online: bool) -> GameColumns:
+    directory = os.path.realpath(directory)  # all files are read from one version, even if a new one is published meanwhile
+    with open(os.path.join(directory, "meta.json"), "r") as f:
+        meta = ujson.load(f)
+    source = meta["source"]
+    print(f"Snapshot games: online {source['online']}, old games from {source['old_games']}, new games from {source['new_games']}, "
+          f"tournaments data from {source['event_list']}")
+    if source["online"] != online:
+        raise Exception(f"Snapshot in directory {directory} has games for online={source['online']}, but online={online} is requested")
+    game_count = meta["game_count"]
+
+    columns: dict[str, memoryview] = {}
+    for name, (typecode, values_per_game) in COLUMNS.items():
+        with open(os.path.join(directory, f"{name}.bin"), "rb") as f:
+            if game_count == 0:
+                columns[name] = memoryview(array(typecode))
+                continue
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        columns[name] = memoryview(mapped).cast(typecode)
+
+    with open(os.path.join(directory, "players.txt"), "r") as f:
+        players = [Player.from_json(data=ujson.loads(line)) for line in f]
+    assert len(players) == meta["player_count"]
+    events = [(pantheon_type, event_id) for pantheon_type, event_id in meta["events"]]
+    print(f"Snapshot of {game_count} games and {len(players)} players attached from directory {directory}")
+    return GameColumns(players=players, events=events, columns=columns)
@@ -1,29 +1,34 @@
 #!/usr/bin/env python3
 import argparse
-from collections import defaultdict
 from typing import Any
 from typing import Optional
 
-import requests
 import ujson
 from datetime import datetime
 # from datetime import timedelta
 
 import db_load
+from export import ExportJob
+from export import build_export_rows
+from export import write_exports
+from game_columns import GameColumns
+from game_snapshot import attach_game_snapshot
+from game_snapshot import publish_game_snapshot
 from players_work import merge_old_and_new_player_ids
 from players_work import replace_names
 from players_work import replace_temporary_replacement_players
 from rating_calc import calc_ratings
-from rating_impl import *
+from rating_impl import RATING_MODELS
+from rating_impl import create_rating_model
+from rating_index import write_index
 from structs import Game
-from structs import Player
-from structs import PlayerStats
+from structs import RatingModel
+from structs import RatingResult
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("--model", type=str, choices=["elo", "trueskill", "openskill_pl", "openskill_bt"],
-                        required=True)
+    parser.add_argument("--model", type=str, choices=list(RATING_MODELS.keys()), nargs="+", required=True)
     parser.add_argument("--load-from-portal", action="store_true", default=False, required=False)
     parser.add_argument("--event-list-file", type=str, required=False)
     parser.add_argument("--date-to", type=str, required=False)
@@ -32,26 +37,86 @@ def main():
     parser.add_argument("--new-pantheon-games-load-file", type=str, required=False)
     parser.add_argument("--old-pantheon-games-dump-file", type=str, required=False)
     parser.add_argument("--new-pantheon-games-dump-file", type=str, required=False)
-    parser.add_argument("--output-file", type=str, required=False)
+    parser.add_argument("--output-file", type=str, required=False)  # '{model}' is replaced with model name
+    parser.add_argument("--log-file", type=str, required=False)
+    parser.add_argument("--csv-file", type=str, required=False)
+    parser.add_argument("--no-player-log", action="store_true", default=False, required=False)
+    parser.add_argument("--export-workers", type=int, default=1, required=False)
+    parser.add_argument("--bulk-db-load", action="store_true", default=False, required=False)
+    parser.add_argument("--index-file", type=str, required=False)
+    parser.add_argument("--decay", action="store_true", default=False, required=False)
+    parser.add_argument("--max-players-in-memory", type=int, required=False)
+    parser.add_argument("--games-snapshot-dump-dir", type=str, required=False)
+    parser.add_argument("--games-snapshot-load-dir", type=str, required=False)
+    parser.add_argument("--accelerated", action="store_true", default=False, required=False)
     args = parser.parse_args()
 
-    rating_model_name = args.model
-    print(f"Rating model name: {rating_model_name}")
-    match rating_model_name:
-        case "elo":
-            rating_model = EloModel()
-        case "trueskill":
-            rating_model = TrueSkillModel()
-        case "openskill_pl":
-            rating_model = OpenSkillPLModel()
-        case "openskill_bt":
-            rating_model = OpenSkillBTModel()
-        case _:
+    rating_models: dict[str, RatingModel] = {}
+    for rating_model_name in args.model:
+        print(f"Rating model name: {rating_model_name}")
+        if rating_model_name not in RATING_MODELS:
             print("Unknown rating model name. Use one of above.")
             return
+        rating_models[rating_model_name] = create_rating_model(rating_model_name=rating_model_name, decay=args.decay)
+    print(f"Rating decay: {args.decay}")
+    if len(rating_models) > 1:
+        for filename in [args.output_file, args.log_file, args.csv_file]:
+            if filename is not None and "{model}" not in filename:
+                print(f"Output file name {filename} must contain '{{model}}' when several models are used")
+                return
 
+    if args.date_to is not None:
+        date_to_str = args.date_to
+        print(f"Date to = '{date_to_str}'")
+        date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
+    else:
+        date_to = datetime.now().date()
+        print(f"Date to = 'today'")
+
+    online: bool = args.online
+    print(f"Online: {online}")
+
+    if args.games_snapshot_load_dir is not None:
+        # games in snapshot are already loaded and filtered, these options would be silently ignored
+        for option in ["load_from_portal", "event_list_file", "old_pantheon_games_load_file", "new_pantheon_games_load_file",
+                       "old_pantheon_games_dump_file", "new_pantheon_games_dump_file", "bulk_db_load", "games_snapshot_dump_dir"]:
+            if getattr(args, option):
+                print(f"Option '--{option.replace('_', '-')}' can't be used with '--games-snapshot-load-dir'")
+                return
+
+    if args.games_snapshot_load_dir is not None:
+        game_columns = attach_game_snapshot(directory=args.games_snapshot_load_dir, online=online)
+    else:
+        all_games, games_source = load_all_games(args=args, online=online)
+        game_columns = GameColumns.from_games(games=all_games)  # encoded once for all models
+        if args.games_snapshot_dump_dir is not None:
+            publish_game_snapshot(game_columns=game_columns, source=games_source, directory=args.games_snapshot_dump_dir)
+
+    export_jobs: list[ExportJob] = []
+    for rating_model_name, rating_model in rating_models.items():
+        rating_result: RatingResult = calc_ratings(games=game_columns, rating_model=rating_model, date_to=date_to,
+                                                   accelerated=args.accelerated,
+                                                   max_players_in_memory=args.max_players_in_memory)
+        if args.index_file is not None:
+            write_index(filename=args.index_file, rating_model_name=rating_model_name, online=online, rating_result=rating_result)
+        output_files = {}
+        for output_format, filename in [("json", args.output_file), ("log", args.log_file), ("csv", args.csv_file)]:
+            if filename is not None:
+                output_files[output_format] = filename.replace("{model}", rating_model_name)
+        export_jobs.append(ExportJob(rating_model_name=rating_model_name,
+                                     online=online,
+                                     rows=build_export_rows(rating_result=rating_result),
+                                     games_by_event=rating_result.games_by_event,
+                                     output_files=output_files))
+
+    write_exports(jobs=export_jobs, workers=args.export_workers, print_player_log=not args.no_player_log)
+
+
+def load_all_games(args: argparse.Namespace, online: bool) -> tuple[list[Game], dict[str, Any]]:
+    # returns games and description of their source, saved with games snapshot
     portal_data: Optional[list[dict[str, Any]]] = None
     if args.load_from_portal:
+        import requests  # only needed here, slow to import
         portal_data = requests.get("https://mahjong.click/api/v0/tournaments/finished/").json()
         print("Loaded tournaments data from portal api")
     elif args.event_list_file is not None:
@@ -80,17 +145,6 @@ def main():
                 portal_names_map[(pantheon_type, player_id)] = player_name
         print(f"Loaded {len(old_portal_event_ids)} old events and {len(new_portal_event_ids)} new events from tournaments data")
 
-    if args.date_to is not None:
-        date_to_str = args.date_to
-        print(f"Date to = '{date_to_str}'")
-        date_to = datetime.strptime(date_to_str, "%Y-%m-%d").date()
-    else:
-        date_to = datetime.now().date()
-        print(f"Date to = 'today'")
-
-    online: bool = args.online
-    print(f"Online: {online}")
-
     # Yoroshiku League hack - it's missing on portal
     if online and (new_portal_event_ids is not None):
         new_portal_event_ids.add(106)
@@ -107,7 +161,8 @@ def main():
                                                    online=online,
                                                    portal_names_map=portal_names_map,
                                                    player_names_file=None,
-                                                   force_event_ids_to_load=None if online else [142, 236])
+                                                   force_event_ids_to_load=None if online else [142, 236],
+                                                   bulk=args.bulk_db_load)
         print(f"{len(old_games)} old games loaded from DB")
     if args.old_pantheon_games_dump_file is not None:
         Game.dump_list(games=old_games, filename=args.old_pantheon_games_dump_file)
@@ -125,7 +180,8 @@ def main():
                                                    online=online,
                                                    portal_names_map=portal_names_map,
                                                    player_names_file="shared/players-data.csv",
-                                                   force_event_ids_to_load=[106, 254, 692] if online else [215, 400, 430, 467])
+                                                   force_event_ids_to_load=[106, 254, 692] if online else [215, 400, 430, 467],
+                                                   bulk=args.bulk_db_load)
         print(f"{len(new_games)} new games loaded from DB")
     if args.new_pantheon_games_dump_file is not None:
         Game.dump_list(games=new_games, filename=args.new_pantheon_games_dump_file)
@@ -138,59 +194,15 @@ def main():
     all_games = old_games + new_games
     merge_old_and_new_player_ids(games=all_games)
     replace_temporary_replacement_players(games=all_games)
-    player_stats_map: dict[Player, PlayerStats] = calc_ratings(games=all_games, rating_model=rating_model, date_to=date_to)
-
-    export_results = []
-    for player, player_stats in sorted(player_stats_map.items(), key=lambda x: -x[1].rating_for_sorting):
-        places = player_stats.places
-        total_games = sum(places)
-        if total_games < 10:
-            continue
-        # if date_to - player_stats.last_game_date.date() > timedelta(days=365 * 2):
-        #     continue
-        rating_for_sorting = player_stats.rating_for_sorting
-        mean, stddev = player_stats.mean_and_stddev
-        print(f"Player {player.name} (old ids {player.old_ids}, new ids {player.new_ids}): confirmed rating {rating_for_sorting:.3f} ({mean:.3f} +/- {stddev:.3f}) in {total_games} games ({places})")
-        sorted_events: list[tuple[str, int]] = sorted(player_stats.event_game_counts.keys(), key=lambda x: (x[0][2], x[1]))  # 'ol[d]' < 'ne[w]'
-        export_element = {
-            "player": player.name,
-            "rating": round(rating_for_sorting, 3),
-            "mean": round(mean, 3),
-            "stddev": round(stddev, 3),
-            "game_count": total_games,
-            "places": str(places),
-            "last_game_date": player_stats.last_game_date.strftime("%Y-%m-%d"),
-            "event_game_counts": [t + "_" + str(i) + " -> " + str(player_stats.event_game_counts[(t, i)]) for (t, i) in sorted_events],
-        }
-        if len(player.old_ids) > 0:
-            export_element["old_ids"] = str(player.old_ids)
-        if len(player.new_ids) > 0:
-            export_element["new_ids"] = str(player.new_ids)
-        export_results.append(export_element)
-
-    if args.output_file is not None:
-        export_to_file(
-            rating_model_name=rating_model_name,
-            all_games=all_games,
-            export_results=export_results,
-            filename=args.output_file,
-        )
-
-
-def export_to_file(rating_model_name: str, all_games: list[Game], export_results: list[dict[str, str]], filename: str):
-    games_by_event: dict[tuple[str, int], int] = defaultdict(int)
-    for game in all_games:
-        games_by_event[(game.pantheon_type, game.event_id)] += 1
-
-    ts_rating = {
-        "tournament_ids": [{"pantheon_type": et, "pantheon_id": eid, "game_count": cnt} for (et, eid), cnt in sorted(games_by_event.items())],
-        rating_model_name: export_results,
+    games_source = {
+        "online": online,
+        "old_games": args.old_pantheon_games_load_file or "db",
+        "new_games": args.new_pantheon_games_load_file or "db",
+        "event_list": "portal api" if args.load_from_portal else args.event_list_file,
+        "old_portal_event_ids": None if old_portal_event_ids is None else sorted(old_portal_event_ids),
+        "new_portal_event_ids": None if new_portal_event_ids is None else sorted(new_portal_event_ids),
     }
-
-    with open(filename, "w") as f:
-        # noinspection PyTypeChecker
-        ujson.dump(ts_rating, f, ensure_ascii=False, indent=2)
-    print(f"Rating by model '{rating_model_name}' exported to file {filename}")
+    return all_games, games_source
 
 
 if __name__ == "__main__":
@@ -0,0 +1,88 @@
+import csv
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Optional
+from typing import Sequence
+
+# id -> name tables of pantheon players, shared by csv and DB loading
+
+
+def build_player_names(player_ids: Sequence[int], player_names: Sequence[str]) -> dict[int, str]:
+    names_by_id: dict[int, str] = dict(zip(player_ids, (name.strip() for name in player_names)))
+    assert len(names_by_id) == len(player_ids)  # ids are unique
+    return names_by_id
+
+
+def parse_player_names_csv(filename: str) -> dict[int, str]:
+    player_ids: list[int] = []
+    player_names: list[str] = []
+    with open(filename, newline="") as fd:
+        reader = csv.reader(fd)
+        next(reader, None)  # header
+        for row in reader:
+            if len(row) == 0:
+                continue
+            player_ids.append(int(row[0]))
+            player_names.append(",".join(row[1:]))  # unquoted names may contain commas
+    return build_player_names(player_ids=player_ids, player_names=player_names)
+
+
+def read_player_names_cache(cache_filename: str) -> Optional[dict]:
+    # any unreadable cache (truncated, written by other python version, old format) is just a cache miss
+    if not os.path.exists(cache_filename):
+        return None
+    try:
+        with open(cache_filename, "rb") as f:
+            cache = pickle.load(f)
+        if not isinstance(cache["mtime_ns"], int) or not isinstance(cache["hash"], str) or not isinstance(cache["names_by_id"], dict):
+            raise ValueError("wrong cache format")
+        return cache
+    except Exception as e:
+        print(f"Ignoring broken cache file {cache_filename}: {e!r}")
+        return None
+
+
+def write_player_names_cache(cache_filename: str, cache: dict):
+    # written to a temporary file and moved into place, so concurrent runs never see a partially written cache
+    cache_dir = os.path.dirname(os.path.abspath(cache_filename))
+    try:
+        fd, tmp_filename = tempfile.mkstemp(dir=cache_dir, prefix=os.path.basename(cache_filename) + ".", suffix=".tmp")
+    except OSError as e:
+        print(f"Can't write cache file {cache_filename}: {e!r}")
+        return
+    try:
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_filename, cache_filename)
+    except BaseException:
+        os.unlink(tmp_filename)
+        raise
+
+
+def load_player_names_csv(filename: str) -> dict[int, str]:
+    # parsed table is cached next to the csv file, cache is valid while file mtime or content hash is the same
+    cache_filename = filename + ".cache"
+    mtime_ns = os.stat(filename).st_mtime_ns
+    cache = read_player_names_cache(cache_filename=cache_filename)
+    if cache is not None and cache["mtime_ns"] == mtime_ns:
+        print(f"Players loaded from cache file {cache_filename}")
+        return cache["names_by_id"]
+
+    with open(filename, "rb") as f:
+        file_hash = hashlib.sha256(f.read()).hexdigest()
+    if cache is not None and cache["hash"] == file_hash:
+        names_by_id = cache["names_by_id"]
+        print(f"Players loaded from cache file {cache_filename}, file {filename} is touched but not changed")
+    else:
+        names_by_id = parse_player_names_csv(filename=filename)
+    write_player_names_cache(cache_filename=cache_filename, cache={"mtime_ns": mtime_ns, "hash": file_hash, "names_by_id": names_by_id})
+    return names_by_id
+
+
+def apply_portal_names(names_by_id: dict[int, str], pantheon_type: str, portal_names_map: dict[tuple[str, int], str]):
+    overrides = {player_id: portal_name for (t, player_id), portal_name in portal_names_map.items()
+                 if t == pantheon_type and player_id in names_by_id and names_by_id[player_id] != portal_name}
+    names_by_id.update(overrides)
+    print(f"Force used portal names for {len(overrides)} players of type {pantheon_type}")
@@ -0,0 +1,102 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import weakref
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from typing import Iterator
+from typing import Optional
+
+from structs import Player
+from structs import PlayerStats
+
+
+class SpillingPlayerStatsMap(MutableMapping):
+    # player -> stats map keeping only recently used stats in memory, the rest is pickled to a temporary sqlite file;
+    # stats objects are written back on eviction, so they must not be kept and modified after other players are accessed
+    def __init__(self, capacity: int, filename: Optional[str] = None):
+        assert capacity > 0
+        self.capacity = capacity
+        self.cache: OrderedDict[Player, PlayerStats] = OrderedDict()
+        self.sequence: dict[Player, int] = {}  # insertion order, iteration follows it like for a regular dict
+        self.players_by_sequence: dict[int, Player] = {}
+        self.next_sequence = 0
+        self.evictions = 0
+        self.loads = 0
+        if filename is None:
+            fd, filename = tempfile.mkstemp(prefix="player_stats_", suffix=".sqlite")
+            os.close(fd)
+            weakref.finalize(self, os.remove, filename)
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("pragma journal_mode = off")
+        self.connection.execute("pragma synchronous = off")
+        self.connection.execute("drop table if exists player_stats")
+        self.connection.execute("create table player_stats (seq integer primary key, data blob not null)")
+        weakref.finalize(self, self.connection.close)
+
+    def evict(self):
+        while len(self.cache) > self.capacity:
+            player, player_stats = self.cache.popitem(last=False)
+            self.connection.execute("insert or replace into player_stats values (?, ?)",
+                                    (self.sequence[player], pickle.dumps(player_stats, protocol=pickle.HIGHEST_PROTOCOL)))
+            self.evictions += 1
+
+    def load(self, seq: int) -> PlayerStats:
+        row = self.connection.execute("select data from player_stats where seq = ?", (seq,)).fetchone()
+        assert row is not None
+        self.loads += 1
+        return pickle.loads(row[0])
+
+    def __getitem__(self, player: Player) -> PlayerStats:
+        if player in self.cache:
+            self.cache.move_to_end(player)
+            return self.cache[player]
+        if player not in self.sequence:
+            raise KeyError(player)
+        player_stats = self.load(seq=self.sequence[player])
+        self.cache[player] = player_stats
+        self.evict()
+        return player_stats
+
+    def __setitem__(self, player: Player, player_stats: PlayerStats):
+        if player not in self.sequence:
+            self.sequence[player] = self.next_sequence
+            self.players_by_sequence[self.next_sequence] = player
+            self.next_sequence += 1
+        self.cache[player] = player_stats
+        self.cache.move_to_end(player)
+        self.evict()
+
+    def __delitem__(self, player: Player):
+        seq = self.sequence.pop(player)  # raises KeyError for unknown players
+        del self.players_by_sequence[seq]
+        self.cache.pop(player, None)
+        self.connection.execute("delete from player_stats where seq = ?", (seq,))
+
+    def __contains__(self, player: object) -> bool:
+        return player in self.sequence
+
+    def __len__(self) -> int:
+        return len(self.sequence)
+
+    def __iter__(self) -> Iterator[Player]:
+        return iter(self.players_by_sequence.values())
+
+    def items(self) -> Iterator[tuple[Player, PlayerStats]]:
+        # read-only pass in insertion order, stats of evicted players are loaded without caching them
+        rows = self.connection.execute("select seq, data from player_stats order by seq")
+        row = rows.fetchone()
+        for seq, player in self.players_by_sequence.items():
+            if player in self.cache:
+                yield player, self.cache[player]
+                continue
+            while row[0] < seq:  # stale rows of players which are in memory now
+                row = rows.fetchone()
+            assert row[0] == seq
+            yield player, pickle.loads(row[1])
+
+    def values(self) -> Iterator[PlayerStats]:
+        for _, player_stats in self.items():
+            yield player_stats
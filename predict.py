@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+import argparse
+
+from prediction import RatingSnapshot
+from rating_impl import RATING_MODELS
+
+
+def read_lines(filename: str) -> list[str]:
+    with open(filename, "r") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-file", type=str, required=True)
+    parser.add_argument("--model", type=str, choices=list(RATING_MODELS.keys()), required=True)
+    parser.add_argument("--online", action="store_true", default=False, required=False)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--tables-file", type=str)  # one table per line, 4 player names separated by ';'
+    group.add_argument("--players-file", type=str)  # one player name per line, tables are chosen here
+    args = parser.parse_args()
+
+    snapshot = RatingSnapshot.load(filename=args.index_file, rating_model_name=args.model, online=args.online)
+    if args.tables_file is not None:
+        tables = [[name.strip() for name in line.split(";")] for line in read_lines(filename=args.tables_file)]
+        for table in tables:
+            assert len(table) == 4 and len(set(table)) == 4, f"Wrong table {table}, 4 different players are expected"
+    else:
+        tables = snapshot.balance_seating(players=read_lines(filename=args.players_file))
+
+    for index, prediction in enumerate(snapshot.predict_tables(tables=tables), start=1):
+        print(f"Table {index}:")
+        for name, expected_place, place_probabilities in zip(prediction.players, prediction.expected_places, prediction.place_probabilities):
+            places = " / ".join(f"{p * 100:.1f}%" for p in place_probabilities)
+            print(f"    {name}: expected place {expected_place:.2f} ({places})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import itertools
+import math
+from typing import Optional
+
+from rating_index import load_ratings
+from rating_impl import create_rating_model
+from structs import R
+from structs import RatingModel
+
+# expected places for candidate tables and balanced seating, based on ratings saved by main.py --index-file
+
+
+def logit(p: float) -> float:
+    p = min(max(p, 1e-12), 1.0 - 1e-12)
+    return math.log(p / (1.0 - p))
+
+
+class TablePrediction:
+    def __init__(self, players: list[str], place_probabilities: list[list[float]]):
+        self.players = players
+        self.place_probabilities = place_probabilities  # [player][place - 1]
+        self.expected_places = [sum((place + 1) * p for place, p in enumerate(row)) for row in place_probabilities]
+
+
+class RatingSnapshot:
+    def __init__(self, rating_model: RatingModel, ratings: dict[str, R]):
+        self.rating_model = rating_model
+        self.ratings = ratings
+        self.player_indices: dict[str, int] = {}
+        self.win_probabilities: list[list[float]] = []
+
+    @staticmethod
+    def load(filename: str, rating_model_name: str, online: bool) -> 'RatingSnapshot':
+        rating_model = create_rating_model(rating_model_name=rating_model_name)
+        ratings = {name: rating_model.rating_from_mean_and_stddev(mean=mean, stddev=stddev)
+                   for name, (mean, stddev) in load_ratings(filename=filename, rating_model_name=rating_model_name, online=online).items()}
+        print(f"Loaded ratings of {len(ratings)} players by model '{rating_model_name}' (online: {online}) from index {filename}")
+        return RatingSnapshot(rating_model=rating_model, ratings=ratings)
+
+    def get_rating(self, name: str) -> R:
+        if name not in self.ratings:
+            print(f"Player {name} is not found, use start rating")
+            self.ratings[name] = self.rating_model.new_rating()
+        return self.ratings[name]
+
+    def get_rating_for_sorting(self, name: str) -> float:
+        return self.rating_model.get_rating_for_sorting(rating=self.get_rating(name=name))
+
+    def prepare(self, names: list[str]):
+        # win probabilities of all pairs are computed at once, then every table is only a lookup
+        names = list(dict.fromkeys(names))
+        if all(name in self.player_indices for name in names):
+            return
+        names = list(self.player_indices.keys()) + [name for name in names if name not in self.player_indices]
+        self.player_indices = {name: i for i, name in enumerate(names)}
+        self.win_probabilities = self.rating_model.win_probabilities(ratings=[self.get_rating(name=name) for name in names])
+
+    def predict_table(self, players: list[str]) -> TablePrediction:
+        # pairwise win probabilities are reduced to one strength per player (Bradley-Terry fit of their log-odds),
+        # then the finishing order follows the Plackett-Luce model, so places come from one distribution over all orders
+        assert len(set(players)) == len(players)
+        self.prepare(names=players)
+        indices = [self.player_indices[name] for name in players]
+        n = len(indices)
+        strengths = []
+        for i in indices:
+            log_odds = sum(logit(self.win_probabilities[i][j]) - logit(self.win_probabilities[j][i]) for j in indices if j != i) / 2
+            strengths.append(math.exp(log_odds / n))
+        place_probabilities = [[0.0] * n for _ in range(n)]
+        for order in itertools.permutations(range(n)):
+            probability = 1.0
+            remaining = sum(strengths)
+            for k in order:
+                probability *= strengths[k] / remaining
+                remaining -= strengths[k]
+            for place, k in enumerate(order):
+                place_probabilities[k][place] += probability
+        return TablePrediction(players=players, place_probabilities=place_probabilities)
+
+    def predict_tables(self, tables: list[list[str]]) -> list[TablePrediction]:
+        self.prepare(names=[name for table in tables for name in table])
+        return [self.predict_table(players=table) for table in tables]
+
+    def balance_seating(self, players: list[str], max_iterations: Optional[int] = None) -> list[list[str]]:
+        # tables with close average ratings: snake seating by rating, then swaps between tables while they help
+        assert len(players) % 4 == 0
+        assert len(set(players)) == len(players)
+        table_count = len(players) // 4
+        strength = {name: self.get_rating_for_sorting(name=name) for name in players}
+        sorted_players = sorted(players, key=lambda name: -strength[name])
+        tables: list[list[str]] = [[] for _ in range(table_count)]
+        for index, name in enumerate(sorted_players):
+            row, column = divmod(index, table_count)
+            tables[column if row % 2 == 0 else table_count - 1 - column].append(name)
+
+        average = sum(strength.values()) / table_count
+        sums = [sum(strength[name] for name in table) for table in tables]
+        iteration = 0
+        improved = True
+        while improved and (max_iterations is None or iteration < max_iterations):
+            improved = False
+            iteration += 1
+            for t1 in range(table_count):
+                for t2 in range(t1 + 1, table_count):
+                    for i1 in range(4):
+                        for i2 in range(4):
+                            diff = strength[tables[t1][i1]] - strength[tables[t2][i2]]
+                            old_cost = (sums[t1] - average) ** 2 + (sums[t2] - average) ** 2
+                            new_cost = (sums[t1] - diff - average) ** 2 + (sums[t2] + diff - average) ** 2
+                            if new_cost < old_cost - 1e-12:
+                                tables[t1][i1], tables[t2][i2] = tables[t2][i2], tables[t1][i1]
+                                sums[t1] -= diff
+                                sums[t2] += diff
+                                improved = True
+        print(f"Seating for {table_count} tables balanced in {iteration} iterations, "
+              f"table rating sums from {min(sums):.3f} to {max(sums):.3f}")
+        return tables
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+import argparse
+
+from rating_index import find_players
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--index-file", type=str, required=True)
+    parser.add_argument("--model", type=str, required=True)
+    parser.add_argument("--online", action="store_true", default=False, required=False)
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--name", type=str)
+    group.add_argument("--old-id", type=int)
+    group.add_argument("--new-id", type=int)
+    group.add_argument("--top", type=int)
+    args = parser.parse_args()
+
+    if args.old_id is not None:
+        players = find_players(filename=args.index_file, rating_model_name=args.model, online=args.online,
+                               pantheon_type="old", player_id=args.old_id)
+    elif args.new_id is not None:
+        players = find_players(filename=args.index_file, rating_model_name=args.model, online=args.online,
+                               pantheon_type="new", player_id=args.new_id)
+    else:
+        players = find_players(filename=args.index_file, rating_model_name=args.model, online=args.online,
+                               name=args.name, top=args.top)
+
+    if len(players) == 0:
+        print("No players found")
+    for p in players:
+        rank = f"#{p['rank']}" if p["rank"] is not None else "unranked"
+        print(f"{rank} Player {p['player']} (old ids {p['old_ids']}, new ids {p['new_ids']}): "
+              f"rating {p['rating']:.3f} ({p['mean']:.3f} +/- {p['stddev']:.3f}) in {p['game_count']} games ({p['places']}), "
+              f"last game {p['last_game_date']}")
+        print("    events: " + ", ".join(f"{t}_{i} -> {c}" for t, i, c in p["event_game_counts"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,124 @@
+from collections import Counter
+from collections.abc import MutableMapping
 from datetime import date
+from itertools import chain
+from typing import Optional
+from typing import Union
 
+from game_columns import GameColumns
+from player_store import SpillingPlayerStatsMap
 from structs import Game
 from structs import Player
 from structs import PlayerStats
+from structs import R
 from structs import RatingModel
+from structs import RatingResult
 
 
-def is_replacement_player_for_game(player: Player, game: Game) -> bool:
-    if player.is_replacement_player:
-        return True
-    key = (game.pantheon_type, game.event_id, game.session_id)
-    return key in player.temporary_replacements
+def get_decayed_rating(rating_model: RatingModel, player_stats: PlayerStats, day: date) -> R:
+    # decay is applied only when rating is used, stored rating is the one after the last game
+    if player_stats.last_game_date is None:
+        return player_stats.rating
+    days_since_last_game = (day - player_stats.last_game_date.date()).days
+    assert days_since_last_game >= 0
+    return rating_model.decay(rating=player_stats.rating, days=days_since_last_game)
 
 
-def calc_ratings(games: list[Game], rating_model: RatingModel, date_to: date) -> dict[Player, PlayerStats]:
-    games.sort(key=lambda g: g.session_date)  # there were games in old pantheon played later than some games in new pantheon
-    games = [g for g in games if g.session_date.date() <= date_to]
+def replay_games(game_columns: GameColumns, game_count: int, rating_model: RatingModel,
+                 player_stats_map: MutableMapping[Player, PlayerStats]):
+    players = game_columns.players
+    events = game_columns.events
+    event_column = game_columns.columns["event"]
+    seat_counts = game_columns.columns["seat_count"]
+    seat_players = game_columns.columns["seat_players"]
+    seat_scores = game_columns.columns["seat_scores"]
+    seat_places = game_columns.columns["seat_places"]
+    for game_index in range(game_count):
+        session_date = game_columns.get_session_date(game_index=game_index)
+        first_seat = 4 * game_index
+        last_seat = first_seat + seat_counts[game_index]
+        game_players = [players[p] for p in seat_players[first_seat:last_seat]]
+        old_ratings = [get_decayed_rating(rating_model=rating_model, player_stats=player_stats_map[player], day=session_date.date())
+                       for player in game_players]
+        new_ratings = rating_model.process_game(old_ratings=old_ratings, scores=seat_scores[first_seat:last_seat].tolist())
+        pantheon_type, event_id = events[event_column[game_index]]
+        for player, new_rating, place in zip(game_players, new_ratings, seat_places[first_seat:last_seat]):
+            player_stats = player_stats_map[player]
+            player_stats.rating = new_rating
+            player_stats.add_event_game(pantheon_type=pantheon_type, event_id=event_id)
+            player_stats.places[place - 1] += 1
+            player_stats.total_games += 1
+            player_stats.last_game_date = session_date  # games are sorted by date
 
-    print(f"Start calc ratings for model {rating_model.__class__.__name__}")
-    player_stats_map: dict[Player, PlayerStats] = {}
-    for game in games:
-        for player in game.players:
-            if not is_replacement_player_for_game(player=player, game=game):
-                if player not in player_stats_map:
-                    player_stats_map[player] = PlayerStats.create(rating_model=rating_model)
-    print(f"Start ratings initialized for {len(player_stats_map)} players")
 
-    for game in games:
-        for player in game.players:
-            if not is_replacement_player_for_game(player=player, game=game):
-                player_stats_map[player].event_game_counts[(game.pantheon_type, game.event_id)] += 1
-                if player_stats_map[player].last_game_date is not None:
-                    days_since_last_game = (game.session_date.date() - player_stats_map[player].last_game_date.date()).days
-                    assert days_since_last_game >= 0
-                    rating_model.adjust(rating=player_stats_map[player].rating, days=days_since_last_game)
+def replay_games_accelerated(game_columns: GameColumns, game_count: int, rating_model: RatingModel,
+                             player_stats_map: MutableMapping[Player, PlayerStats]):
+    # ratings are replayed by the model kernel over the columns, game stats are counted per column at C speed, no per seat python code
+    player_count = game_columns.count_players(game_count=game_count)
+    seat_players = memoryview(game_columns.columns["seat_players"])[:4 * game_count]
+    ratings = rating_model.replay_games(ratings=[rating_model.new_rating() for _ in range(player_count)],
+                                        seat_players=seat_players,
+                                        seat_scores=memoryview(game_columns.columns["seat_scores"])[:4 * game_count],
+                                        seat_counts=memoryview(game_columns.columns["seat_count"])[:game_count])
 
-        players_with_scores = []
-        for i in range(4):
-            if not is_replacement_player_for_game(player=game.players[i], game=game):
-                players_with_scores.append((game.players[i], game.scores[i]))
-        players_with_scores.sort(key=lambda ps: (-ps[1], ps[0].name))
+    # seat columns are padded to 4 seats per game with player -1, these entries are skipped
+    game_indices = range(game_count)
+    event_column = memoryview(game_columns.columns["event"])[:game_count]
+    place_counts = Counter(zip(seat_players, memoryview(game_columns.columns["seat_places"])[:4 * game_count]))
+    event_counts = Counter(zip(seat_players, chain.from_iterable(zip(event_column, event_column, event_column, event_column))))
+    last_games = dict(zip(seat_players, chain.from_iterable(zip(game_indices, game_indices, game_indices, game_indices))))
 
-        old_ratings = [player_stats_map[ps[0]].rating for ps in players_with_scores]
-        scores = [ps[1] for ps in players_with_scores]
-        new_ratings = rating_model.process_game(old_ratings=old_ratings, scores=scores)
+    stats = [PlayerStats(rating=rating) for rating in ratings]
+    for (player_index, place), count in place_counts.items():
+        if player_index >= 0:
+            stats[player_index].places[place - 1] = count
+            stats[player_index].total_games += count
+    for (player_index, event_index), count in event_counts.items():
+        if player_index >= 0:
+            stats[player_index].event_game_counts[game_columns.events[event_index]] = count
+    for player_index, game_index in last_games.items():
+        if player_index >= 0:
+            stats[player_index].last_game_date = game_columns.get_session_date(game_index=game_index)
+    for player, player_stats in zip(game_columns.players, stats):
+        player_stats.sorted_events = sorted(player_stats.event_game_counts.keys(), key=PlayerStats.event_sort_key)
+        player_stats_map[player] = player_stats
 
-        for i in range(len(players_with_scores)):
-            player = players_with_scores[i][0]
-            player_stats_map[player].rating = new_ratings[i]
 
-        for i in range(4):
-            player = game.players[i]
-            if not is_replacement_player_for_game(player=player, game=game):
-                place = game.places[i]
-                player_stats_map[player].places[place - 1] += 1
-                if player_stats_map[player].last_game_date is None or game.session_date > player_stats_map[player].last_game_date:
-                    player_stats_map[player].last_game_date = game.session_date
-    print(f"All games till date {date_to} are processed")
+def calc_ratings(games: Union[list[Game], GameColumns], rating_model: RatingModel, date_to: date,
+                 accelerated: bool = False, max_players_in_memory: Optional[int] = None,
+                 min_games_for_leaderboard: int = 10) -> RatingResult:
+    # games can be encoded once and passed as columns to calculate several models
+    game_columns = games if isinstance(games, GameColumns) else GameColumns.from_games(games=games)
+    games_by_event = game_columns.get_games_by_event()
+    game_count = game_columns.count_games_till(date_to=date_to)
 
-    for player_stats in player_stats_map.values():
-        if player_stats.last_game_date is not None:
-            days_since_last_game = (date_to - player_stats.last_game_date.date()).days
-            assert days_since_last_game >= 0
-            rating_model.adjust(rating=player_stats.rating, days=days_since_last_game)
-    print(f"Ratings adjusted to the date {date_to}")
+    print(f"Start calc ratings for model {rating_model.__class__.__name__}")
+    player_stats_map: MutableMapping[Player, PlayerStats] = {}
+    if max_players_in_memory is not None:
+        player_stats_map = SpillingPlayerStatsMap(capacity=max_players_in_memory)
+        print(f"Stats of at most {max_players_in_memory} players are kept in memory, others are saved to {player_stats_map.filename}")
 
-    for player_stats in player_stats_map.values():
-        player_stats.rating_for_sorting = rating_model.get_rating_for_sorting(rating=player_stats.rating)
-        player_stats.mean_and_stddev = rating_model.get_mean_and_stddev(rating=player_stats.rating)
+    if accelerated and rating_model.supports_replay_games():
+        # models with replay kernel don't decay ratings
+        replay_games_accelerated(game_columns=game_columns, game_count=game_count, rating_model=rating_model, player_stats_map=player_stats_map)
+    else:
+        if accelerated:
+            print(f"Model {rating_model.__class__.__name__} has no accelerated replay, fall back to the regular one")
+        for player in game_columns.players[:game_columns.count_players(game_count=game_count)]:
+            player_stats_map[player] = PlayerStats.create(rating_model=rating_model)
+        print(f"Start ratings initialized for {len(player_stats_map)} players")
+        replay_games(game_columns=game_columns, game_count=game_count, rating_model=rating_model, player_stats_map=player_stats_map)
+    print(f"All {game_count} games till date {date_to} are processed")
+    if isinstance(player_stats_map, SpillingPlayerStatsMap):
+        print(f"Player stats were saved to disk {player_stats_map.evictions} times and loaded {player_stats_map.loads} times")
+
+    for player in list(player_stats_map.keys()):
+        player_stats = player_stats_map[player]
+        rating = get_decayed_rating(rating_model=rating_model, player_stats=player_stats, day=date_to)
+        player_stats.rating_for_sorting = rating_model.get_rating_for_sorting(rating=rating)
+        player_stats.mean_and_stddev = rating_model.get_mean_and_stddev(rating=rating)
+    print(f"Ratings adjusted to the date {date_to}")
 
-    return player_stats_map
+    return RatingResult(player_stats_map=player_stats_map,
+                        games_by_event=games_by_event,
+                        min_games_for_leaderboard=min_games_for_leaderboard)
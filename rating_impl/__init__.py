@@ -1,4 +1,29 @@
-from rating_impl.elo_impl import EloModel
-from rating_impl.openskill_bt_impl import OpenSkillBTModel
-from rating_impl.openskill_pl_impl import OpenSkillPLModel
-from rating_impl.trueskill_impl import TrueSkillModel
+import importlib
+
+from structs import RatingModel
+
+# backends are imported only when selected, so e.g. elo runs don't load trueskill and openskill
+RATING_MODELS: dict[str, tuple[str, str]] = {
+    "elo": ("rating_impl.elo_impl", "EloModel"),
+    "trueskill": ("rating_impl.trueskill_impl", "TrueSkillModel"),
+    "openskill_pl": ("rating_impl.openskill_pl_impl", "OpenSkillPLModel"),
+    "openskill_bt": ("rating_impl.openskill_bt_impl", "OpenSkillBTModel"),
+}
+
+
+def get_rating_model_class(rating_model_name: str) -> type[RatingModel]:
+    if rating_model_name not in RATING_MODELS:
+        raise Exception(f"Unknown rating model name: {rating_model_name}")
+    module_name, class_name = RATING_MODELS[rating_model_name]
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def create_rating_model(rating_model_name: str, decay: bool = False) -> RatingModel:
+    return get_rating_model_class(rating_model_name=rating_model_name)(decay=decay)
+
+
+def __getattr__(name: str):
+    for module_name, class_name in RATING_MODELS.values():
+        if class_name == name:
+            return getattr(importlib.import_module(module_name), class_name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,62 @@
 import math
+from typing import Callable
+from typing import Optional
+from typing import Sequence
 
 from structs import RatingModel
 
+# loading numba and compiled kernel takes about half a second, it pays off only on long histories
+MIN_GAMES_FOR_COMPILED_REPLAY = 30000
+
+
+def elo_expected_score(r1: float, r2: float, max_rating_diff: float) -> float:
+    return 1.0 / (1.0 + math.pow(10.0, min(r2 - r1, max_rating_diff) / max_rating_diff))
+
+
+def replay_elo_games(ratings, seat_players, seat_scores, seat_counts, k: float, max_rating_diff: float):
+    # same arithmetic as EloModel.process_game, runs as is or compiled by numba
+    new_ratings = [0.0, 0.0, 0.0, 0.0]
+    for g in range(len(seat_counts)):
+        n = seat_counts[g]
+        base = 4 * g
+        for i in range(n):
+            r1 = ratings[seat_players[base + i]]
+            s1 = seat_scores[base + i]
+            delta = 0.0
+            for j in range(n):
+                if i == j:
+                    continue
+                expected = elo_expected_score(r1, ratings[seat_players[base + j]], max_rating_diff)
+                s2 = seat_scores[base + j]
+                if s1 > s2:
+                    actual = 1.0
+                elif s1 < s2:
+                    actual = 0.0
+                else:
+                    actual = 0.5
+                delta += k * (actual - expected)
+            new_ratings[i] = r1 + delta
+        for i in range(n):
+            ratings[seat_players[base + i]] = new_ratings[i]
+
+
+COMPILED_REPLAY_ELO_GAMES: Optional[Callable] = None
+
+
+def get_compiled_replay_elo_games() -> Callable:
+    # compiled once per process; cache=True keeps machine code in __pycache__, so next processes only load it
+    global COMPILED_REPLAY_ELO_GAMES
+    if COMPILED_REPLAY_ELO_GAMES is None:
+        import numba
+        from numba.extending import register_jitable
+        register_jitable(elo_expected_score)  # lets compiled code call it, python code still calls the plain function
+        COMPILED_REPLAY_ELO_GAMES = numba.njit(cache=True)(replay_elo_games)
+    return COMPILED_REPLAY_ELO_GAMES
+
 
 class EloModel(RatingModel):
-    def __init__(self):
+    def __init__(self, decay: bool = False):
+        self.decay_enabled = decay  # no uncertainty to decay, ratings stay the same
         self.start_rating = 1500.0
         self.k = 10.0
         self.max_rating_diff = 400.0
@@ -28,9 +80,7 @@ class EloModel(RatingModel):
             for j in range(n):
                 if i == j:
                     continue
-                r1 = old_ratings[i]
-                r2 = old_ratings[j]
-                expected = 1.0 / (1.0 + math.pow(10.0, min(r2 - r1, self.max_rating_diff) / self.max_rating_diff))
+                expected = elo_expected_score(r1=old_ratings[i], r2=old_ratings[j], max_rating_diff=self.max_rating_diff)
                 actual = self.get_outcome(score1=scores[i], score2=scores[j])
                 deltas[i] += self.k * (actual - expected)
         new_ratings = old_ratings.copy()
@@ -38,11 +88,44 @@ class EloModel(RatingModel):
             new_ratings[i] += deltas[i]
         return new_ratings
 
+    def supports_replay_games(self) -> bool:
+        return True
+
+    def replay_games(self, ratings: list[float], seat_players: Sequence[int], seat_scores: Sequence[float], seat_counts: Sequence[int]) -> list[float]:
+        if len(seat_counts) < MIN_GAMES_FOR_COMPILED_REPLAY:
+            print(f"Replay {len(seat_counts)} games in pure python, too few to compile")
+            return self.replay_games_python(ratings=ratings, seat_players=seat_players, seat_scores=seat_scores, seat_counts=seat_counts)
+        try:
+            import numpy
+            compiled_replay = get_compiled_replay_elo_games()
+        except ImportError:
+            print("Numba is not installed, replay games in pure python")
+            return self.replay_games_python(ratings=ratings, seat_players=seat_players, seat_scores=seat_scores, seat_counts=seat_counts)
+        ratings_array = numpy.array(ratings, dtype=numpy.float64)
+        # seat columns are passed without copying
+        compiled_replay(ratings_array, numpy.asarray(seat_players), numpy.asarray(seat_scores), numpy.asarray(seat_counts),
+                        self.k, self.max_rating_diff)
+        return ratings_array.tolist()
+
+    def replay_games_python(self, ratings: list[float], seat_players: Sequence[int], seat_scores: Sequence[float], seat_counts: Sequence[int]) -> list[float]:
+        ratings = ratings.copy()
+        replay_elo_games(ratings, seat_players, seat_scores, seat_counts, self.k, self.max_rating_diff)
+        return ratings
+
     def get_rating_for_sorting(self, rating: float) -> float:
         return rating
 
     def get_mean_and_stddev(self, rating: float) -> tuple[float, float]:
         return rating, 0.0  # not sure how to calculate stddev
 
-    def adjust(self, rating: float, days: int):
-        pass
+    def rating_from_mean_and_stddev(self, mean: float, stddev: float) -> float:
+        return mean
+
+    def win_probabilities(self, ratings: list[float]) -> list[list[float]]:
+        n = len(ratings)
+        return [[0.0 if i == j else elo_expected_score(r1=ratings[i], r2=ratings[j], max_rating_diff=self.max_rating_diff)
+                 for j in range(n)]
+                for i in range(n)]
+
+    def decay(self, rating: float, days: int) -> float:
+        return rating
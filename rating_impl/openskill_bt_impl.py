@@ -1,12 +1,20 @@
+import math
+from statistics import NormalDist
+
 from openskill.models import BradleyTerryFull
 from openskill.models import BradleyTerryFullRating
 
 from structs import RatingModel
 
+NORMAL_DISTRIBUTION = NormalDist()
+
 
 class OpenSkillBTModel(RatingModel):
-    def __init__(self):
+    def __init__(self, decay: bool = False):
         self.model = BradleyTerryFull()
+        self.decay_enabled = decay
+        self.decay_after_days = 180
+        self.sigma_decay_per_day = 0.001
 
     def new_rating(self) -> BradleyTerryFullRating:
         return self.model.rating()
@@ -24,8 +32,20 @@ class OpenSkillBTModel(RatingModel):
     def get_mean_and_stddev(self, rating: BradleyTerryFullRating) -> tuple[float, float]:
         return rating.mu, rating.sigma
 
-    def adjust(self, rating: BradleyTerryFullRating, days: int):
-        return
-        # if days <= 180:
-        #     return
-        # rating.sigma += 0.001 * (days - 180)
+    def rating_from_mean_and_stddev(self, mean: float, stddev: float) -> BradleyTerryFullRating:
+        return self.model.rating(mu=mean, sigma=stddev)
+
+    def win_probabilities(self, ratings: list[BradleyTerryFullRating]) -> list[list[float]]:
+        # same as model.predict_win for two teams of one player
+        n = len(ratings)
+        double_beta_squared = 2.0 * self.model.beta ** 2
+        return [[0.0 if i == j else NORMAL_DISTRIBUTION.cdf((ratings[i].mu - ratings[j].mu) /
+                                                            math.sqrt(double_beta_squared + ratings[i].sigma ** 2 + ratings[j].sigma ** 2))
+                 for j in range(n)]
+                for i in range(n)]
+
+    def decay(self, rating: BradleyTerryFullRating, days: int) -> BradleyTerryFullRating:
+        if not self.decay_enabled or days <= self.decay_after_days:
+            return rating
+        sigma = min(rating.sigma + self.sigma_decay_per_day * (days - self.decay_after_days), self.model.sigma)
+        return self.model.rating(mu=rating.mu, sigma=sigma, name=rating.name)
@@ -1,12 +1,20 @@
+import math
+from statistics import NormalDist
+
 from openskill.models import PlackettLuce
 from openskill.models import PlackettLuceRating
 
 from structs import RatingModel
 
+NORMAL_DISTRIBUTION = NormalDist()
+
 
 class OpenSkillPLModel(RatingModel):
-    def __init__(self):
+    def __init__(self, decay: bool = False):
         self.model = PlackettLuce()
+        self.decay_enabled = decay
+        self.decay_after_days = 180
+        self.sigma_decay_per_day = 0.0015
 
     def new_rating(self) -> PlackettLuceRating:
         return self.model.rating()
@@ -24,8 +32,20 @@ class OpenSkillPLModel(RatingModel):
     def get_mean_and_stddev(self, rating: PlackettLuceRating) -> tuple[float, float]:
         return rating.mu, rating.sigma
 
-    def adjust(self, rating: PlackettLuceRating, days: int):
-        return
-        # if days <= 180:
-        #     return
-        # rating.sigma += 0.0015 * (days - 180)
+    def rating_from_mean_and_stddev(self, mean: float, stddev: float) -> PlackettLuceRating:
+        return self.model.rating(mu=mean, sigma=stddev)
+
+    def win_probabilities(self, ratings: list[PlackettLuceRating]) -> list[list[float]]:
+        # same as model.predict_win for two teams of one player
+        n = len(ratings)
+        double_beta_squared = 2.0 * self.model.beta ** 2
+        return [[0.0 if i == j else NORMAL_DISTRIBUTION.cdf((ratings[i].mu - ratings[j].mu) /
+                                                            math.sqrt(double_beta_squared + ratings[i].sigma ** 2 + ratings[j].sigma ** 2))
+                 for j in range(n)]
+                for i in range(n)]
+
+    def decay(self, rating: PlackettLuceRating, days: int) -> PlackettLuceRating:
+        if not self.decay_enabled or days <= self.decay_after_days:
+            return rating
+        sigma = min(rating.sigma + self.sigma_decay_per_day * (days - self.decay_after_days), self.model.sigma)
+        return self.model.rating(mu=rating.mu, sigma=sigma, name=rating.name)
@@ -1,11 +1,16 @@
+import math
+
 import trueskill
 
 from structs import RatingModel
 
 
 class TrueSkillModel(RatingModel):
-    def __init__(self):
+    def __init__(self, decay: bool = False):
         self.model = trueskill.TrueSkill(draw_probability=0.0)
+        self.decay_enabled = decay
+        self.decay_after_days = 180
+        self.sigma_decay_per_day = 0.0005
 
     def new_rating(self) -> trueskill.Rating:
         return self.model.create_rating()
@@ -24,19 +29,19 @@ class TrueSkillModel(RatingModel):
     def get_mean_and_stddev(self, rating: trueskill.Rating) -> tuple[float, float]:
         return rating.mu, rating.sigma
 
-    def adjust(self, rating: trueskill.Rating, days: int):
-        return
-        # if days <= 180:
-        #     return
-        #
-        # old_pi = rating.pi
-        # old_tau = rating.tau
-        # old_sigma = 1.0 / (old_pi ** 0.5)
-        # old_mu = old_tau / old_pi
-        #
-        # new_sigma = old_sigma + 0.0005 * (days - 180)  # here
-        # new_pi = 1.0 / (new_sigma ** 2)
-        # new_tau = new_pi * old_mu
-        #
-        # rating.pi = new_pi
-        # rating.tau = new_tau
+    def rating_from_mean_and_stddev(self, mean: float, stddev: float) -> trueskill.Rating:
+        return self.model.create_rating(mu=mean, sigma=stddev)
+
+    def win_probabilities(self, ratings: list[trueskill.Rating]) -> list[list[float]]:
+        n = len(ratings)
+        double_beta_squared = 2.0 * self.model.beta ** 2
+        return [[0.0 if i == j else self.model.cdf((ratings[i].mu - ratings[j].mu) /
+                                                   math.sqrt(double_beta_squared + ratings[i].sigma ** 2 + ratings[j].sigma ** 2))
+                 for j in range(n)]
+                for i in range(n)]
+
+    def decay(self, rating: trueskill.Rating, days: int) -> trueskill.Rating:
+        if not self.decay_enabled or days <= self.decay_after_days:
+            return rating
+        sigma = min(rating.sigma + self.sigma_decay_per_day * (days - self.decay_after_days), self.model.sigma)
+        return self.model.create_rating(mu=rating.mu, sigma=sigma)
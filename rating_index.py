@@ -0,0 +1,120 @@
+import sqlite3
+from typing import Any
+from typing import Optional
+from typing import TYPE_CHECKING
+
+import ujson
+
+if TYPE_CHECKING:
+    from structs import RatingResult  # not imported at runtime, query.py must work without shared/players_mapping.py
+
+# sqlite file with computed ratings, to look players up without recalculation (see query.py)
+# one file can hold results of all models, both offline and online
+
+
+def open_index(filename: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(filename)
+    connection.execute("create table if not exists ratings ("
+                       " model text not null,"
+                       " online integer not null,"
+                       " rank integer,"
+                       " name text not null,"
+                       " old_ids text not null,"
+                       " new_ids text not null,"
+                       " rating real not null,"
+                       " mean real not null,"
+                       " stddev real not null,"
+                       " game_count integer not null,"
+                       " places text not null,"
+                       " event_game_counts text not null,"
+                       " last_game_date text)")
+    connection.execute("create table if not exists player_ids ("
+                       " model text not null,"
+                       " online integer not null,"
+                       " pantheon_type text not null,"
+                       " player_id integer not null,"
+                       " name text not null)")
+    connection.execute("create index if not exists ratings_name on ratings (model, online, name)")
+    connection.execute("create index if not exists ratings_rank on ratings (model, online, rank)")
+    connection.execute("create index if not exists player_ids_id on player_ids (model, online, pantheon_type, player_id)")
+    return connection
+
+
+def write_index(filename: str, rating_model_name: str, online: bool, rating_result: 'RatingResult'):
+    ranks = {player: rank for rank, (player, _) in enumerate(rating_result.leaderboard, start=1)}
+    rating_rows = []
+    player_id_rows = []
+    for player, player_stats in rating_result.player_stats_map.items():
+        mean, stddev = player_stats.mean_and_stddev
+        last_game_date = player_stats.last_game_date.strftime("%Y-%m-%d") if player_stats.last_game_date is not None else None
+        event_game_counts = [[t, i, player_stats.event_game_counts[(t, i)]] for (t, i) in player_stats.sorted_events]
+        rating_rows.append((rating_model_name, int(online), ranks.get(player), player.name,
+                            ujson.dumps(player.old_ids), ujson.dumps(player.new_ids),
+                            player_stats.rating_for_sorting, mean, stddev, player_stats.total_games,
+                            ujson.dumps(player_stats.places), ujson.dumps(event_game_counts, ensure_ascii=False),
+                            last_game_date))
+        for player_id in player.old_ids:
+            player_id_rows.append((rating_model_name, int(online), "old", player_id, player.name))
+        for player_id in player.new_ids:
+            player_id_rows.append((rating_model_name, int(online), "new", player_id, player.name))
+
+    with open_index(filename=filename) as connection:
+        connection.execute("delete from ratings where model = ? and online = ?", (rating_model_name, int(online)))
+        connection.execute("delete from player_ids where model = ? and online = ?", (rating_model_name, int(online)))
+        connection.executemany("insert into ratings values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rating_rows)
+        connection.executemany("insert into player_ids values (?, ?, ?, ?, ?)", player_id_rows)
+    connection.close()
+    print(f"Ratings of {len(rating_rows)} players by model '{rating_model_name}' (online: {online}) written to index {filename}")
+
+
+def row_to_dict(row: sqlite3.Row) -> dict[str, Any]:
+    return {
+        "rank": row["rank"],
+        "player": row["name"],
+        "old_ids": ujson.loads(row["old_ids"]),
+        "new_ids": ujson.loads(row["new_ids"]),
+        "rating": row["rating"],
+        "mean": row["mean"],
+        "stddev": row["stddev"],
+        "game_count": row["game_count"],
+        "places": ujson.loads(row["places"]),
+        "event_game_counts": [tuple(e) for e in ujson.loads(row["event_game_counts"])],
+        "last_game_date": row["last_game_date"],
+    }
+
+
+def load_ratings(filename: str, rating_model_name: str, online: bool) -> dict[str, tuple[float, float]]:
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    rows = connection.execute("select name, mean, stddev from ratings where model = ? and online = ?",
+                              (rating_model_name, int(online))).fetchall()
+    connection.close()
+    return {name: (mean, stddev) for name, mean, stddev in rows}
+
+
+def find_players(filename: str, rating_model_name: str, online: bool,
+                 name: Optional[str] = None, pantheon_type: Optional[str] = None, player_id: Optional[int] = None,
+                 top: Optional[int] = None) -> list[dict[str, Any]]:
+    connection = sqlite3.connect(f"file:{filename}?mode=ro", uri=True)
+    connection.row_factory = sqlite3.Row
+    key = (rating_model_name, int(online))
+    if name is not None:
+        rows = connection.execute("select * from ratings where model = ? and online = ? and name = ?", key + (name,)).fetchall()
+        if len(rows) == 0:
+            pattern = "%" + name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+            rows = connection.execute("select * from ratings where model = ? and online = ? and name like ? escape '\\'"
+                                      " order by rank is null, rank",
+                                      key + (pattern,)).fetchall()
+    elif player_id is not None:
+        assert pantheon_type in {"old", "new"}
+        rows = connection.execute("select r.* from player_ids p join ratings r"
+                                  " on (r.model = p.model and r.online = p.online and r.name = p.name)"
+                                  " where p.model = ? and p.online = ? and p.pantheon_type = ? and p.player_id = ?",
+                                  key + (pantheon_type, player_id)).fetchall()
+    elif top is not None:
+        rows = connection.execute("select * from ratings where model = ? and online = ? and rank is not null"
+                                  " order by rank limit ?", key + (top,)).fetchall()
+    else:
+        raise Exception("Specify player name, player id or leaderboard size")
+    result = [row_to_dict(row=row) for row in rows]
+    connection.close()
+    return result
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+from datetime import datetime
+from typing import Any
+
+import ujson
+
+from game_columns import GameColumns
+from players_work import merge_old_and_new_player_ids
+from players_work import replace_names
+from players_work import replace_temporary_replacement_players
+from rating_calc import calc_ratings
+from rating_impl import RATING_MODELS
+from rating_impl import create_rating_model
+from structs import Game
+from structs import RatingModel
+from structs import RatingResult
+
+# calc_ratings arguments for every replay engine, "reference" is the plain one-game-at-a-time replay
+ENGINES: dict[str, dict[str, Any]] = {
+    "reference": {},
+    "accelerated": {"accelerated": True},
+    "bounded": {"max_players_in_memory": 50},
+}
+
+
+def load_games(old_games_file: str, new_games_file: str) -> list[Game]:
+    old_games = Game.load_list(filename=old_games_file)
+    replace_names(games=old_games, pantheon_type="old")
+    new_games = Game.load_list(filename=new_games_file)
+    replace_names(games=new_games, pantheon_type="new")
+    all_games = old_games + new_games
+    merge_old_and_new_player_ids(games=all_games)
+    replace_temporary_replacement_players(games=all_games)
+    return all_games
+
+
+def run_engine(games: GameColumns, rating_model: RatingModel, engine_name: str, date_to: date,
+               measure_memory: bool) -> tuple[RatingResult, float, float]:
+    gc.collect()
+    if measure_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    rating_result = calc_ratings(games=games, rating_model=rating_model, date_to=date_to, **ENGINES[engine_name])
+    elapsed = time.perf_counter() - start_time
+    peak_memory_mb = 0.0
+    if measure_memory:
+        peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+        tracemalloc.stop()
+    return rating_result, elapsed, peak_memory_mb
+
+
+def compare_results(reference: RatingResult, other: RatingResult, tolerance: float) -> list[str]:
+    errors = []
+    if set(reference.player_stats_map.keys()) != set(other.player_stats_map.keys()):
+        errors.append("different sets of players")
+        return errors
+    max_diff = 0.0
+    for player, reference_stats in reference.player_stats_map.items():
+        stats = other.player_stats_map[player]
+        if reference_stats.places != stats.places or reference_stats.event_game_counts != stats.event_game_counts:
+            errors.append(f"player {player.name}: different game stats")
+        values = [(reference_stats.rating_for_sorting, stats.rating_for_sorting),
+                  (reference_stats.mean_and_stddev[0], stats.mean_and_stddev[0]),
+                  (reference_stats.mean_and_stddev[1], stats.mean_and_stddev[1])]
+        for reference_value, value in values:
+            diff = abs(reference_value - value)
+            max_diff = max(max_diff, diff)
+            if diff > tolerance:
+                errors.append(f"player {player.name}: {value} differs from reference {reference_value} by {diff}")
+                break
+    print(f"Max rating difference from reference: {max_diff}")
+    if [p for p, _ in reference.leaderboard] != [p for p, _ in other.leaderboard]:
+        errors.append("different leaderboard order")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, choices=list(RATING_MODELS.keys()), nargs="+", required=True)
+    parser.add_argument("--engine", type=str, choices=list(ENGINES.keys()), nargs="+", default=list(ENGINES.keys()))
+    parser.add_argument("--old-pantheon-games-load-file", type=str, required=True)
+    parser.add_argument("--new-pantheon-games-load-file", type=str, required=True)
+    parser.add_argument("--date-to", type=str, required=False)
+    parser.add_argument("--decay", action="store_true", default=False, required=False)
+    parser.add_argument("--tolerance", type=float, default=1e-9, required=False)
+    parser.add_argument("--repeat", type=int, default=3, required=False)
+    parser.add_argument("--baseline-file", type=str, required=False)
+    parser.add_argument("--update-baseline", action="store_true", default=False, required=False)
+    parser.add_argument("--max-slowdown", type=float, default=0.2, required=False)
+    args = parser.parse_args()
+
+    date_to = datetime.strptime(args.date_to, "%Y-%m-%d").date() if args.date_to is not None else datetime.now().date()
+    games = load_games(old_games_file=args.old_pantheon_games_load_file, new_games_file=args.new_pantheon_games_load_file)
+    games = GameColumns.from_games(games=games)  # encoded once, like main.py does for several models
+    game_count = games.count_games_till(date_to=date_to)
+    print(f"{game_count} games loaded")
+
+    baseline: dict[str, dict[str, dict[str, float]]] = {}
+    if args.baseline_file is not None and os.path.exists(args.baseline_file):
+        with open(args.baseline_file, "r") as f:
+            baseline = ujson.load(f)
+
+    errors: list[str] = []
+    measurements: dict[str, dict[str, dict[str, float]]] = {}
+    for rating_model_name in args.model:
+        reference_model = create_rating_model(rating_model_name=rating_model_name, decay=args.decay)
+        reference_result, _, _ = run_engine(games=games, rating_model=reference_model, engine_name="reference",
+                                            date_to=date_to, measure_memory=False)
+        for engine_name in args.engine:
+            # one model for all runs of the engine; the first run is a warm-up, so timing and memory don't include
+            # one-time costs like loading or compiling the replay kernel
+            rating_model = create_rating_model(rating_model_name=rating_model_name, decay=args.decay)
+            rating_result, _, _ = run_engine(games=games, rating_model=rating_model, engine_name=engine_name,
+                                             date_to=date_to, measure_memory=False)
+            engine_errors = compare_results(reference=reference_result, other=rating_result, tolerance=args.tolerance)
+            errors.extend(f"model {rating_model_name}, engine {engine_name}: {e}" for e in engine_errors)
+
+            _, _, peak_memory_mb = run_engine(games=games, rating_model=rating_model, engine_name=engine_name,
+                                              date_to=date_to, measure_memory=True)
+            best_time = min(run_engine(games=games, rating_model=rating_model, engine_name=engine_name,
+                                       date_to=date_to, measure_memory=False)[1] for _ in range(args.repeat))
+            games_per_second = game_count / best_time
+            measurements.setdefault(rating_model_name, {})[engine_name] = {
+                "games_per_second": round(games_per_second, 1),
+                "peak_memory_mb": round(peak_memory_mb, 3),
+            }
+            print(f"Model {rating_model_name}, engine {engine_name}: {games_per_second:.1f} games/s, "
+                  f"peak memory {peak_memory_mb:.3f} MB, {len(engine_errors)} errors")
+
+            baseline_games_per_second = baseline.get(rating_model_name, {}).get(engine_name, {}).get("games_per_second")
+            if baseline_games_per_second is not None and games_per_second < baseline_games_per_second * (1.0 - args.max_slowdown):
+                errors.append(f"model {rating_model_name}, engine {engine_name}: {games_per_second:.1f} games/s "
+                              f"is slower than baseline {baseline_games_per_second:.1f} games/s")
+
+    if args.update_baseline:
+        assert args.baseline_file is not None
+        for rating_model_name, engine_measurements in measurements.items():
+            baseline.setdefault(rating_model_name, {}).update(engine_measurements)
+        with open(args.baseline_file, "w") as f:
+            # noinspection PyTypeChecker
+            ujson.dump(baseline, f, indent=2)
+        print(f"Baseline saved to file {args.baseline_file}")
+
+    for error in errors:
+        print(f"ERROR: {error}")
+    if len(errors) > 0:
+        sys.exit(1)
+    print("All engines match the reference")
+
+
+if __name__ == "__main__":
+    main()
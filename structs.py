@@ -1,7 +1,10 @@
+import bisect
 from collections import defaultdict
+from collections.abc import MutableMapping
 from datetime import datetime
 from typing import Any
 from typing import Optional
+from typing import Sequence
 from typing import TypeVar
 
 import ujson
@@ -85,13 +88,29 @@ class RatingModel:
     def process_game(self, old_ratings: list[R], scores: list[float]) -> list[R]:
         raise NotImplementedError()
 
+    def supports_replay_games(self) -> bool:
+        return False
+
+    def replay_games(self, ratings: list[R], seat_players: Sequence[int], seat_scores: Sequence[float], seat_counts: Sequence[int]) -> list[R]:
+        # all games at once, only for models which don't decay ratings between games; seat arrays are GameColumns columns:
+        # game i has seat_counts[i] rated players at indices [4 * i, 4 * i + seat_counts[i]) of seat arrays, sorted as for process_game
+        raise NotImplementedError()
+
     def get_rating_for_sorting(self, rating: R) -> float:
         raise NotImplementedError()
 
     def get_mean_and_stddev(self, rating: R) -> tuple[float, float]:
         raise NotImplementedError()
 
-    def adjust(self, rating: R, days: int):
+    def rating_from_mean_and_stddev(self, mean: float, stddev: float) -> R:
+        raise NotImplementedError()
+
+    def win_probabilities(self, ratings: list[R]) -> list[list[float]]:
+        # result[i][j] is the probability that player i finishes above player j
+        raise NotImplementedError()
+
+    def decay(self, rating: R, days: int) -> R:
+        # rating after given days without games, as one closed form step; the given rating must not be modified
         raise NotImplementedError()
 
 
@@ -103,11 +122,35 @@ class PlayerStats:
         self.places = [0, 0, 0, 0]
         self.last_game_date: Optional[datetime] = None
         self.event_game_counts: dict[tuple[str, int], int] = defaultdict(int)
+        self.sorted_events: list[tuple[str, int]] = []  # keys of event_game_counts, old pantheon events first
+        self.total_games = 0
 
     @staticmethod
     def create(rating_model: RatingModel) -> 'PlayerStats':
         return PlayerStats(rating=rating_model.new_rating())
 
+    @staticmethod
+    def event_sort_key(event: tuple[str, int]) -> tuple[str, int]:
+        return event[0][2], event[1]  # 'ol[d]' < 'ne[w]'
+
+    def add_event_game(self, pantheon_type: str, event_id: int):
+        event = (pantheon_type, event_id)
+        if event not in self.event_game_counts:
+            bisect.insort(self.sorted_events, event, key=PlayerStats.event_sort_key)
+        self.event_game_counts[event] += 1
+
+
+class RatingResult:
+    def __init__(self, player_stats_map: MutableMapping[Player, PlayerStats], games_by_event: dict[tuple[str, int], int],
+                 min_games_for_leaderboard: int):
+        self.player_stats_map = player_stats_map
+        self.games_by_event = games_by_event
+        self.min_games_for_leaderboard = min_games_for_leaderboard
+        self.leaderboard: list[tuple[Player, PlayerStats]] = sorted(
+            ((p, ps) for p, ps in player_stats_map.items() if ps.total_games >= min_games_for_leaderboard),
+            key=lambda x: -x[1].rating_for_sorting,
+        )
+
 
 class Game:
     def __init__(self, pantheon_type: str, event_id: int, session_id: int, session_date: datetime,